@@ -20,21 +20,53 @@ CT Log Support: REMOVED (yielded 0 results, URLScan provides better coverage)
 
 import json
 import logging
+import math
+import multiprocessing
 import datetime
 from datetime import timezone
 import os
+import queue
 import sys
+import threading
 import time
 import requests
 import re
 import urllib.parse
-from typing import List, Dict, Tuple, Set
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import defaultdict, deque
+from functools import lru_cache, partial
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple, Set
+
+try:
+    from rapidfuzz.distance import Levenshtein
+except ImportError:  # Fall back to the pure-Python implementation below
+    Levenshtein = None
+
+try:
+    import ahocorasick
+except ImportError:  # Fall back to plain substring scans
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module
+    orjson = None
 
 # ==================== CONFIGURATION ====================
 
 # Score threshold for flagging domains
 SCORE_THRESHOLD = 70
 
+# Scoring runs in a process pool once a run has enough domains to pay
+# for starting the workers; smaller runs are scored in-process
+SCORING_PARALLEL_MIN = 2000
+SCORING_CHUNKSIZE = 256
+# Workers start while the URLScan fetcher threads hold locks, so they must
+# not be forked from this process
+SCORING_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
 # API Keys from environment
 URLSCAN_API_KEY = os.environ.get("URLSCAN_API_KEY")
 
@@ -72,7 +104,7 @@ MANUAL_CHECK_DOMAINS = [
 ]
 
 # ==================== WHITELISTED DOMAINS ====================
-WHITELISTED_DOMAINS = [
+WHITELISTED_DOMAINS = frozenset({
     # Courier services
     'econt.com',
     'econt.bg',
@@ -133,11 +165,11 @@ WHITELISTED_DOMAINS = [
     # Bulgarian government services
     'mvr.bg',
     'e-uslugi.mvr.bg',
-]
+})
 
 # ==================== BRAND KEYWORDS ====================
 # These are the core brands we protect
-BRAND_KEYWORDS = [
+BRAND_KEYWORDS = (
     # Main couriers
     'econt',
     'speedy',
@@ -212,10 +244,10 @@ BRAND_KEYWORDS = [
     'ibanking',
     'assetonline',
     'bdbank'
-]
+)
 
 # ==================== SECONDARY KEYWORDS ====================
-TRANSACTION_KEYWORDS = [
+TRANSACTION_KEYWORDS = (
     'tracking',
     'delivery',
     'shipment',
@@ -255,10 +287,10 @@ TRANSACTION_KEYWORDS = [
     'debit',
     'card',
     'smetka'
-]
+)
 
 # ==================== GEOGRAPHIC INDICATORS ====================
-GEO_INDICATORS = ['.bg', 'bulgaria', 'bg-', '-bg']
+GEO_INDICATORS = ('.bg', 'bulgaria', 'bg-', '-bg')
 
 # ==================== SUSPICIOUS TLDs ====================
 SUSPICIOUS_TLDS = (
@@ -295,6 +327,102 @@ INFRASTRUCTURE_PATTERNS = (
     'bgptools',  # BGP monitoring tools (not phishing)
 )
 
+# ==================== PRECOMPILED PATTERNS ====================
+# Built once at import time so the per-domain hot path never re-parses a pattern
+
+# Manual domains bypass the suspicious platform/TLD filter
+MANUAL_DOMAIN_SET = frozenset(MANUAL_CHECK_DOMAINS)
+
+# Whitelist subdomains are matched with one endswith(tuple) call
+WHITELIST_SUFFIXES = tuple('.' + domain for domain in WHITELISTED_DOMAINS)
+
+# Brand must sit on a label boundary: start/end of domain, '.' or '-'.
+# The capture lives inside a lookahead so adjacent brands sharing a separator
+# (e-uslugi-mvr, e-postbank) are all reported; longest brands are tried first.
+BRAND_RE = re.compile(
+    r'(?:^|(?<=[.\-]))(?=('
+    + '|'.join(re.escape(b) for b in sorted(BRAND_KEYWORDS, key=len, reverse=True))
+    + r')(?:[.\-]|$))'
+)
+BRAND_ORDER = {brand: i for i, brand in enumerate(BRAND_KEYWORDS)}
+# The alternation reports only the longest brand at a position, so the shorter
+# brands a match starts with (dsk for dsk-direct) are added back from here
+BRAND_PREFIXES = {
+    brand: tuple(
+        prefix for prefix in BRAND_KEYWORDS
+        if brand.startswith((prefix + '.', prefix + '-'))
+    )
+    for brand in BRAND_KEYWORDS
+}
+
+# Domain labels are split on dots and hyphens for homoglyph/typo checks
+PART_SPLIT_RE = re.compile(r'[.\-]')
+
+# Scoring indicators
+NUMERIC_SUFFIX_RE = re.compile(r'-\d{3,}\.|\d{4,}\.')
+CONSONANT_CLUSTER_RE = re.compile(r'[bcdfghjklmnpqrstvwxyz]{3,}')
+MIXED_ALNUM_RE = re.compile(r'[a-z]+\d+[a-z]+|\d+[a-z]+\d+')
+BG_TLD_ABUSE_RE = re.compile(r'\.bg-[a-z]{2,4}\.(?:cfd|tk|ml|ga|cf|gq|xyz|online|site|click|icu)')
+
+# Direct impersonation of whitelisted domains
+# Patterns like: econt-bg, econtbg, speedy-bg, speedybg
+DIRECT_IMPERSONATION_PATTERNS = (
+    r'econt-?bg',
+    r'speedy-?bg',
+    r'bgpost-?bg',
+    r'olx-?bg',
+    r'sameday-?bg',
+    r'easypay-?bg',
+    r'epay-?bg',
+    r'borica-?bg',
+    r'bg-?econt',
+    r'bg-?speedy',
+    r'bg-?post',
+    r'bg-?olx',
+    # Online banking impersonation patterns
+    r'dsk-?direct',
+    r'dsk-?mobile',
+    r'e-?postbank',
+    r'bulbankonline',
+    r'uac-?procredit',
+    # MVR (Ministry of Interior) impersonation patterns
+    r'mvr-?bg',
+    r'mvrbg',
+    r'mvrgovbg',
+    r'mvr-?gov',
+    r'e-?uslugi-?mvr',
+    r'bg-?mvr',
+)
+# One alternation: a single scan instead of one search per pattern
+DIRECT_IMPERSONATION_RE = re.compile('|'.join(DIRECT_IMPERSONATION_PATTERNS))
+
+# Brands shorter than 4 chars are too noisy for edit-distance matching
+TYPOSQUAT_BRANDS = tuple(b for b in BRAND_KEYWORDS if len(b) >= 4)
+
+
+def build_keyword_automaton(keywords):
+    """Build an Aho-Corasick automaton mapping each keyword to (priority, keyword)"""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for index, keyword in enumerate(keywords):
+        automaton.add_word(keyword, (index, keyword))
+    automaton.make_automaton()
+    return automaton
+
+
+def find_keyword(text: str, keywords, automaton) -> Optional[str]:
+    """Return the first keyword (in list order) contained in text, or None"""
+    if automaton is None:
+        return next((keyword for keyword in keywords if keyword in text), None)
+    # One pass finds every occurrence; keep the highest-priority keyword
+    hits = [value for _, value in automaton.iter(text)]
+    return min(hits)[1] if hits else None
+
+
+TRANSACTION_AC = build_keyword_automaton(TRANSACTION_KEYWORDS)
+INFRASTRUCTURE_AC = build_keyword_automaton(INFRASTRUCTURE_PATTERNS)
+
 # ==================== OUTPUT CONFIGURATION ====================
 OUTPUT_FILE = 'feed/phishing_feed.json'
 STATS_FILE = 'feed/stats.json'
@@ -310,18 +438,8 @@ logging.basicConfig(
 
 def is_whitelisted(domain: str) -> bool:
     """Check if domain is legitimate (whitelisted) and should be excluded"""
-    domain_lower = domain.lower()
-    
-    if domain_lower.startswith('www.'):
-        domain_lower = domain_lower[4:]
-    
-    for whitelisted in WHITELISTED_DOMAINS:
-        if domain_lower == whitelisted:
-            return True
-        if domain_lower.endswith('.' + whitelisted):
-            return True
-    
-    return False
+    domain_lower = domain.lower().removeprefix('www.')
+    return domain_lower in WHITELISTED_DOMAINS or domain_lower.endswith(WHITELIST_SUFFIXES)
 
 
 def contains_brand_impersonation(domain: str) -> Tuple[bool, List[str]]:
@@ -339,33 +457,17 @@ def contains_brand_impersonation(domain: str) -> Tuple[bool, List[str]]:
     - Before separator: speedy-bg.cfd ✓, econt.com ✓
     - Standalone: domain-speedy, speedy ✓
     """
-    domain_lower = domain.lower()
-    matched_brands = []
+    check_domain = domain.lower()
     
     # Remove www. prefix
-    check_domain = domain_lower
     if check_domain.startswith('www.'):
         check_domain = check_domain[4:]
     
-    for brand in BRAND_KEYWORDS:
-        # STRICT patterns - brand must be at word boundary
-        patterns = [
-            f'^{brand}\\.',           # speedy.bg-pv.cfd (start, before dot)
-            f'^{brand}-',              # speedy-bg.cfd (start, before hyphen)
-            f'^{brand}$',              # speedy (entire domain name part)
-            f'\\.{brand}\\.',          # www.speedy.com (between dots)
-            f'\\.{brand}-',            # info.speedy-bg.cfd (after dot, before hyphen)
-            f'\\.{brand}$',            # domain.speedy (after dot, at end)
-            f'-{brand}\\.',            # bg-speedy.cfd (after hyphen, before dot)
-            f'-{brand}-',              # x-speedy-bg (between hyphens)
-            f'-{brand}$',              # domain-speedy (after hyphen, at end)
-        ]
-        
-        # Check all patterns
-        for pattern in patterns:
-            if re.search(pattern, check_domain):
-                matched_brands.append(brand)
-                break  # Only count each brand once
+    # Single scan for all brands; report them in BRAND_KEYWORDS order
+    matched = set(BRAND_RE.findall(check_domain))
+    for brand in tuple(matched):
+        matched.update(BRAND_PREFIXES[brand])
+    matched_brands = sorted(matched, key=BRAND_ORDER.__getitem__)
     
     return (len(matched_brands) > 0, matched_brands)
 
@@ -387,6 +489,14 @@ HOMOGLYPH_MAP = {
     'y': ['у', 'ү', 'ý'],              # Cyrillic 'у', 'ү'
 }
 
+# Reverse lookup (homoglyph → Latin), incl. 0 → o, and its str.translate table
+HOMOGLYPH_REVERSE = {
+    homoglyph: latin
+    for latin, homoglyphs in HOMOGLYPH_MAP.items()
+    for homoglyph in homoglyphs
+}
+HOMOGLYPH_TRANS = str.maketrans(HOMOGLYPH_REVERSE)
+
 def detect_homoglyphs(domain: str, brands: List[str]) -> Tuple[bool, List[str]]:
     """
     Detect homoglyph attacks where similar-looking characters replace Latin letters.
@@ -405,85 +515,119 @@ def detect_homoglyphs(domain: str, brands: List[str]) -> Tuple[bool, List[str]]:
     if domain_lower.startswith('www.'):
         domain_lower = domain_lower[4:]
     
+    # Plain ASCII without zeros has nothing to normalize (most domains)
+    if domain_lower.isascii() and '0' not in domain_lower:
+        return (False, [])
+    
     homoglyphs_found = []
     
+    # Normalize each suspect domain part once, not once per brand:
+    # (part, homoglyph-normalized or None, zero-replaced or None)
+    suspects = []
+    for part in PART_SPLIT_RE.split(domain_lower):
+        if len(part) < 3:
+            continue
+        has_non_ascii = not part.isascii()
+        has_zero = '0' in part
+        # Plain ASCII parts without zeros can't hold a look-alike
+        if has_non_ascii or has_zero:
+            suspects.append((
+                part,
+                normalize_homoglyphs(part) if has_non_ascii else None,
+                part.replace('0', 'o') if has_zero else None
+            ))
+    
     # Check each brand
     for brand in brands:
-        # Extract domain parts
-        parts = re.split(r'[.\-]', domain_lower)
-        
-        for part in parts:
-            # Skip if too short or too different in length
-            if len(part) < 3 or abs(len(part) - len(brand)) > 2:
+        for part, normalized, part_with_o in suspects:
+            # Skip if too different in length
+            if abs(len(part) - len(brand)) > 2:
                 continue
             
-            # Check if this part contains homoglyphs of the brand
-            # Convert part to ASCII-only to detect non-ASCII chars
-            has_non_ascii = not all(ord(c) < 128 for c in part)
-            
-            if has_non_ascii:
-                # Normalize homoglyphs to their Latin equivalents
-                normalized = normalize_homoglyphs(part)
-                
-                # Check if normalized version matches brand
-                if normalized == brand or (len(normalized) >= 4 and normalized in brand):
-                    homoglyphs_found.append(part)
-                    break
+            # Check if normalized homoglyphs match the brand
+            if normalized is not None and (
+                normalized == brand or (len(normalized) >= 4 and normalized in brand)
+            ):
+                homoglyphs_found.append(part)
+                break
             
             # Also check for zero instead of 'o' (ec0nt)
-            if '0' in part:
-                part_with_o = part.replace('0', 'o')
-                if part_with_o == brand:
-                    homoglyphs_found.append(part)
-                    break
+            if part_with_o == brand:
+                homoglyphs_found.append(part)
+                break
     
     return (len(homoglyphs_found) > 0, homoglyphs_found)
 
 
 def normalize_homoglyphs(text: str) -> str:
     """Normalize homoglyphs to their Latin equivalents"""
-    result = []
-    for char in text:
-        # Try to find this char in homoglyph map
-        found = False
-        for latin, homoglyphs in HOMOGLYPH_MAP.items():
-            if char in homoglyphs:
-                result.append(latin)
-                found = True
-                break
-        
-        if not found:
-            # Keep special case: 0 → o
-            if char == '0':
-                result.append('o')
-            else:
-                result.append(char)
-    
-    return ''.join(result)
+    return text.translate(HOMOGLYPH_TRANS)
 
 
 # ==================== TYPOSQUATTING DETECTION ====================
 
-def levenshtein_distance(s1: str, s2: str) -> int:
-    """Calculate Levenshtein (edit) distance between two strings"""
+def levenshtein_distance(s1: str, s2: str, max_edit: Optional[int] = None) -> int:
+    """
+    Calculate Levenshtein (edit) distance between two strings
+    
+    With max_edit set, any distance above it is reported as max_edit + 1
+    (same contract as rapidfuzz's score_cutoff), which lets dissimilar
+    pairs bail out before the DP table is filled.
+    """
     if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
+        s1, s2 = s2, s1
+    
+    if max_edit is not None and len(s1) - len(s2) > max_edit:
+        return max_edit + 1
     
     if len(s2) == 0:
         return len(s1)
     
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
+    previous_row = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1, 1):
+        current_row = [i]
+        # Carry the last cell in a local and pick the cheapest edit with plain
+        # comparisons; min() and extra list reads dominated this inner loop
+        cell = row_min = i
         for j, c2 in enumerate(s2):
             # Cost of insertions, deletions, or substitutions
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
+            cell += 1
+            insertion = previous_row[j + 1] + 1
+            if insertion < cell:
+                cell = insertion
+            substitution = previous_row[j] + (c1 != c2)
+            if substitution < cell:
+                cell = substitution
+            if cell < row_min:
+                row_min = cell
+            current_row.append(cell)
+        # Row minimums never decrease, so the final distance is already too big
+        if max_edit is not None and row_min > max_edit:
+            return max_edit + 1
         previous_row = current_row
     
-    return previous_row[-1]
+    distance = previous_row[-1]
+    if max_edit is not None and distance > max_edit:
+        return max_edit + 1
+    return distance
+
+
+# Only distances of 1-2 matter for typosquatting, so let rapidfuzz stop early
+if Levenshtein is not None:
+    typo_distance = partial(Levenshtein.distance, score_cutoff=2)
+else:
+    typo_distance = partial(levenshtein_distance, max_edit=2)
+
+
+@lru_cache(maxsize=None)
+def group_brands_by_length(brands: Tuple[str, ...]) -> Dict[int, List[Tuple[int, str, frozenset]]]:
+    """Group typosquatting candidates by length as (position, brand, charset)"""
+    by_length = defaultdict(list)
+    for index, brand in enumerate(brands):
+        # Skip very short brands to avoid false positives
+        if len(brand) >= 4:
+            by_length[len(brand)].append((index, brand, frozenset(brand)))
+    return dict(by_length)
 
 
 def detect_typosquatting(domain: str, brands: List[str]) -> Tuple[bool, List[Dict]]:
@@ -504,42 +648,44 @@ def detect_typosquatting(domain: str, brands: List[str]) -> Tuple[bool, List[Dic
         Each typo is: {'brand': 'speedy', 'typo': 'spedy', 'distance': 1, 'type': 'missing_char'}
     """
     domain_lower = domain.lower()
-    detected_typos = []
     
     # Remove www. prefix
     if domain_lower.startswith('www.'):
         domain_lower = domain_lower[4:]
     
-    # Extract words from domain (split by dots and hyphens)
-    parts = re.split(r'[.\-]', domain_lower)
+    # Extract words from domain (split by dots and hyphens), dropping parts
+    # too short to be a typo once instead of re-checking them for every brand
+    parts = [part for part in PART_SPLIT_RE.split(domain_lower) if len(part) >= 3]
     
-    for brand in brands:
-        # Skip very short brands to avoid false positives
-        if len(brand) < 4:
-            continue
+    brands_by_len = group_brands_by_length(tuple(brands))
+    found = []
+    
+    for part in parts:
+        part_chars = set(part)
         
-        for part in parts:
-            # Skip if part is too short or too different in length
-            if len(part) < 3:
-                continue
-            
-            # Calculate edit distance
-            distance = levenshtein_distance(part, brand)
-            
-            # Distance of 1-2 = likely typosquatting
-            # But only if lengths are similar (within 2 chars)
-            length_diff = abs(len(part) - len(brand))
-            
-            if 0 < distance <= 2 and length_diff <= 2:
-                # Make sure it's not an exact match
-                if part != brand:
-                    # Found potential typosquatting
-                    detected_typos.append({
+        # Only brands within 2 chars of the part's length can be 1-2 edits away
+        for length in range(len(part) - 2, len(part) + 3):
+            for index, brand, brand_chars in brands_by_len.get(length, ()):
+                # Each edit changes at most 2 distinct chars, so 2 edits can't
+                # explain a larger character-set difference
+                if len(part_chars ^ brand_chars) > 4:
+                    continue
+                
+                # Calculate edit distance
+                distance = typo_distance(part, brand)
+                
+                # Distance of 1-2 = likely typosquatting (0 = exact brand match)
+                if 0 < distance <= 2:
+                    found.append((index, {
                         'brand': brand,
                         'typo': part,
                         'distance': distance,
                         'type': classify_typo_type(brand, part)
-                    })
+                    }))
+    
+    # Report typos grouped by brand, in the caller's brand order
+    found.sort(key=lambda item: item[0])
+    detected_typos = [typo for _, typo in found]
     
     return (len(detected_typos) > 0, detected_typos)
 
@@ -563,12 +709,15 @@ def classify_typo_type(original: str, typo: str) -> str:
 
 # ==================== SCORING SYSTEM ====================
 
+@lru_cache(maxsize=65536)
 def calculate_score(domain: str) -> Tuple[int, Dict]:
     """
     Calculate phishing suspicion score (0-100, max possible: 195)
     
     ENHANCED: Now includes homoglyph and typosquatting detection
     FOCUSED: Prioritizes Bulgarian (.bg) context
+    CACHED: Results are memoized per domain, so callers must treat the
+    returned details dict as read-only
     """
     score = 0
     details = {
@@ -587,6 +736,14 @@ def calculate_score(domain: str) -> Tuple[int, Dict]:
         'typosquatting_details': []
     }
     
+    # Known-safe domains skip the whole regex/homoglyph/typo battery
+    if is_whitelisted(domain):
+        details['whitelisted'] = True
+        return 0, details
+    if is_infrastructure_domain(domain):
+        details['infrastructure'] = True
+        return 0, details
+    
     domain_lower = domain.lower()
     
     if domain_lower.startswith('www.'):
@@ -606,25 +763,26 @@ def calculate_score(domain: str) -> Tuple[int, Dict]:
         details['homoglyphs_used'] = homoglyphs_list
     
     # 3. TYPOSQUATTING DETECTION (+25) - Common phishing technique
-    has_typos, typos_list = detect_typosquatting(domain, BRAND_KEYWORDS)
+    has_typos, typos_list = detect_typosquatting(domain, TYPOSQUAT_BRANDS)
     if has_typos:
         score += 25
         details['typosquatting_detected'] = True
         details['typosquatting_details'] = typos_list
     
     # 4. FREE HOSTING DETECTION (+25)
-    for suffix in FREE_HOSTING_SUFFIXES:
-        if domain_lower.endswith(suffix):
-            score += 25
-            details['free_hosting'] = suffix
-            break
+    # endswith(tuple) rejects the common no-match case in one C call
+    if domain_lower.endswith(FREE_HOSTING_SUFFIXES):
+        score += 25
+        details['free_hosting'] = next(
+            suffix for suffix in FREE_HOSTING_SUFFIXES if domain_lower.endswith(suffix)
+        )
     
     # 5. SUSPICIOUS TLD DETECTION (+20)
-    for tld in SUSPICIOUS_TLDS:
-        if domain_lower.endswith(tld):
-            score += 20
-            details['suspicious_tld'] = tld
-            break
+    if domain_lower.endswith(SUSPICIOUS_TLDS):
+        score += 20
+        details['suspicious_tld'] = next(
+            tld for tld in SUSPICIOUS_TLDS if domain_lower.endswith(tld)
+        )
     
     # 6. GEOGRAPHIC INDICATOR (+15) - BULGARIA-FOCUSED
     has_bg_context = False
@@ -636,11 +794,10 @@ def calculate_score(domain: str) -> Tuple[int, Dict]:
             break
     
     # 7. TRANSACTION KEYWORDS (+10)
-    for keyword in TRANSACTION_KEYWORDS:
-        if keyword in domain_lower:
-            score += 10
-            details['transaction_keywords'].append(keyword)
-            break
+    keyword = find_keyword(domain_lower, TRANSACTION_KEYWORDS, TRANSACTION_AC)
+    if keyword:
+        score += 10
+        details['transaction_keywords'].append(keyword)
     
     # 8. MULTIPLE HYPHENS (+10)
     hyphen_count = domain_lower.count('-')
@@ -649,7 +806,7 @@ def calculate_score(domain: str) -> Tuple[int, Dict]:
         details['multiple_hyphens'] = True
     
     # 9. NUMERIC SUFFIX (+10)
-    if re.search(r'-\d{3,}\.', domain_lower) or re.search(r'\d{4,}\.', domain_lower):
+    if NUMERIC_SUFFIX_RE.search(domain_lower):
         score += 10
         details['numeric_suffix'] = True
     
@@ -662,15 +819,15 @@ def calculate_score(domain: str) -> Tuple[int, Dict]:
     # 11. HIGH ENTROPY / RANDOMNESS (+10)
     domain_name = domain_lower.split('.')[0]
     if len(domain_name) > 10:
-        consonant_clusters = len(re.findall(r'[bcdfghjklmnpqrstvwxyz]{3,}', domain_name))
-        mixed_alphanum = len(re.findall(r'[a-z]+\d+[a-z]+|\d+[a-z]+\d+', domain_name))
+        consonant_clusters = len(CONSONANT_CLUSTER_RE.findall(domain_name))
+        mixed_alphanum = len(MIXED_ALNUM_RE.findall(domain_name))
         
         if consonant_clusters >= 2 or mixed_alphanum >= 2:
             score += 10
             details['high_entropy'] = True
     
     # BONUS: .bg-XX.TLD pattern (+10) - BULGARIA-SPECIFIC ABUSE
-    if re.search(r'\.bg-[a-z]{2,4}\.(cfd|tk|ml|ga|cf|gq|xyz|online|site|click|icu)', domain_lower):
+    if BG_TLD_ABUSE_RE.search(domain_lower):
         score += 10
         details['bg_tld_abuse'] = True
         has_bg_context = True
@@ -683,40 +840,10 @@ def calculate_score(domain: str) -> Tuple[int, Dict]:
     
     # BONUS: Direct impersonation of whitelisted domains (+15)
     # Patterns like: econt-bg, econtbg, speedy-bg, speedybg
-    direct_impersonation_patterns = [
-        r'econt-?bg',
-        r'speedy-?bg', 
-        r'bgpost-?bg',
-        r'olx-?bg',
-        r'sameday-?bg',
-        r'easypay-?bg',
-        r'epay-?bg',
-        r'borica-?bg',
-        r'bg-?econt',
-        r'bg-?speedy',
-        r'bg-?post',
-        r'bg-?olx',
-        # Online banking impersonation patterns
-        r'dsk-?direct',
-        r'dsk-?mobile',
-        r'e-?postbank',
-        r'bulbankonline',
-        r'uac-?procredit',
-        # MVR (Ministry of Interior) impersonation patterns
-        r'mvr-?bg',
-        r'mvrbg',
-        r'mvrgovbg',
-        r'mvr-?gov',
-        r'e-?uslugi-?mvr',
-        r'bg-?mvr',
-    ]
-    
-    for pattern in direct_impersonation_patterns:
-        if re.search(pattern, domain_lower):
-            score += 15
-            details['direct_impersonation'] = True
-            has_bg_context = True  # These are clearly Bulgarian-focused
-            break
+    if DIRECT_IMPERSONATION_RE.search(domain_lower):
+        score += 15
+        details['direct_impersonation'] = True
+        has_bg_context = True  # These are clearly Bulgarian-focused
     
     # REFINED PENALTY: Only for weak/generic matches without ANY Bulgarian connection
     # Apply ONLY if:
@@ -754,23 +881,47 @@ def calculate_score(domain: str) -> Tuple[int, Dict]:
 def is_infrastructure_domain(domain: str) -> bool:
     """Check if domain is infrastructure/internal (should be excluded)"""
     domain_lower = domain.lower()
-    return any(pattern in domain_lower for pattern in INFRASTRUCTURE_PATTERNS)
+    return find_keyword(domain_lower, INFRASTRUCTURE_PATTERNS, INFRASTRUCTURE_AC) is not None
 
 
-def contains_courier_keyword(domain: str) -> Tuple[bool, List[str]]:
-    """Check if domain contains courier/brand keywords using STRICT matching"""
-    return contains_brand_impersonation(domain)
+# ==================== FEED MANAGEMENT ====================
 
+def read_json(path: str):
+    """Read a JSON file, using orjson when available"""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_json(path: str, data):
+    """
+    Write data as 2-space indented JSON, using orjson when available
+    
+    Writes to a temporary file and renames it over path, so readers (and a
+    run killed mid-write) never see a truncated feed.
+    """
+    tmp_path = path + '.tmp'
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
-# ==================== FEED MANAGEMENT ====================
 
 def load_existing_feed() -> List[Dict]:
     """Load existing phishing feed from JSON"""
     if os.path.exists(OUTPUT_FILE):
         try:
-            with open(OUTPUT_FILE, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
+            return read_json(OUTPUT_FILE)
+        except json.JSONDecodeError:  # orjson.JSONDecodeError subclasses it
             logging.warning("⚠️ Feed file corrupted, starting fresh")
             return []
     return []
@@ -779,21 +930,23 @@ def load_existing_feed() -> List[Dict]:
 def save_feed(feed_data: List[Dict]):
     """Save phishing feed to JSON"""
     try:
-        with open(OUTPUT_FILE, 'w') as f:
-            json.dump(feed_data, f, indent=2)
+        write_json(OUTPUT_FILE, feed_data)
         logging.info(f"✅ Feed saved with {len(feed_data)} entries")
     except Exception as e:
         logging.error(f"❌ Error saving feed: {e}")
 
 
-def add_to_feed(domain: str, score: int, details: Dict, source: str):
-    """Add a suspicious domain to the feed (no duplicates)"""
-    feed_data = load_existing_feed()
+def add_to_feed(domain: str, score: int, details: Dict, source: str,
+                feed_data: List[Dict], feed_index: Set[str]):
+    """
+    Add a suspicious domain to the in-memory feed (no duplicates)
     
-    for entry in feed_data:
-        if entry['domain'] == domain:
-            logging.debug(f"Domain {domain} already in feed")
-            return
+    feed_index holds the domains already in feed_data; the caller persists
+    the feed with save_feed() once all domains are processed.
+    """
+    if domain in feed_index:
+        logging.debug(f"Domain {domain} already in feed")
+        return
     
     entry = {
         'domain': domain,
@@ -804,7 +957,7 @@ def add_to_feed(domain: str, score: int, details: Dict, source: str):
     }
     
     feed_data.append(entry)
-    save_feed(feed_data)
+    feed_index.add(domain)
     logging.info(f"➕ Added to feed: {domain} (score: {score})")
 
 
@@ -814,8 +967,7 @@ def save_run_stats(scanned_domains: set, phishing_domains: set, elapsed_time: fl
     existing_stats = {}
     if os.path.exists(STATS_FILE):
         try:
-            with open(STATS_FILE, 'r') as f:
-                existing_stats = json.load(f)
+            existing_stats = read_json(STATS_FILE)
         except (json.JSONDecodeError, FileNotFoundError):
             existing_stats = {}
 
@@ -854,8 +1006,7 @@ def save_run_stats(scanned_domains: set, phishing_domains: set, elapsed_time: fl
     }
 
     try:
-        with open(STATS_FILE, 'w') as f:
-            json.dump(stats, f, indent=2)
+        write_json(STATS_FILE, stats)
         logging.info(f"📊 Stats saved: {len(scanned_domains)} scanned, "
                      f"{len(phishing_domains)} phishing ({len(new_phishing)} new) | "
                      f"Totals: {total_scanned} scanned, {len(all_phishing)} phishing")
@@ -885,10 +1036,241 @@ def check_manual_domains() -> Set[str]:
 
 # ==================== URLSCAN.IO INTEGRATION ====================
 
-def fetch_urlscan_targeted() -> Set[str]:
+URLSCAN_SEARCH_URL = "https://urlscan.io/api/v1/search/"
+URLSCAN_MAX_WORKERS = 4
+URLSCAN_RATE_LIMIT = 60  # search calls per minute shared by all workers
+URLSCAN_PAGE_SIZE = 100
+# Pages per query (URLSCAN_PAGE_SIZE scans each); every page is one search
+# call against the API quota. Override with --max-pages or the environment
+URLSCAN_MAX_PAGES = int(os.environ.get("URLSCAN_MAX_PAGES", 3))
+URLSCAN_RATE_LIMIT_RETRIES = 3  # per page, after a 429
+URLSCAN_MAX_RETRY_WAIT = 60  # seconds; caps a long Retry-After on a 429
+URLSCAN_SATURATION = 0.2  # stop paging once a full page is <20% new domains
+URLSCAN_QUEUE_SIZE = 1000  # domains fetched but not yet scored
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls evenly to stay within calls/period"""
+    
+    def __init__(self, calls: int, period: float):
+        self.interval = period / calls
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+    
+    def wait(self):
+        """Block until the caller's slot comes up"""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def create_urlscan_session() -> requests.Session:
+    """
+    Pooled keep-alive session that retries 5xx with exponential backoff
+    
+    429s are retried by urlscan_get instead, so a long Retry-After never
+    blocks a worker inside the session.
+    """
+    session = requests.Session()
+    if URLSCAN_API_KEY:
+        session.headers['API-Key'] = URLSCAN_API_KEY
+    retry = Retry(
+        total=3,
+        backoff_factor=2,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+    session.mount('https://', HTTPAdapter(max_retries=retry, pool_maxsize=URLSCAN_MAX_WORKERS))
+    return session
+
+
+URLSCAN_SESSION = create_urlscan_session()
+URLSCAN_LIMITER = RateLimiter(URLSCAN_RATE_LIMIT, 60)
+SEEN_DOMAINS_LOCK = threading.Lock()
+
+
+def urlscan_retry_delay(response: requests.Response) -> float:
+    """Seconds to wait after a 429: Retry-After, capped at URLSCAN_MAX_RETRY_WAIT"""
+    try:
+        delay = float(response.headers.get('Retry-After', URLSCAN_MAX_RETRY_WAIT))
+    except ValueError:
+        delay = URLSCAN_MAX_RETRY_WAIT
+    return min(max(delay, 1.0), URLSCAN_MAX_RETRY_WAIT)
+
+
+def urlscan_get(url: str, stream: Optional['DomainStream'] = None) -> Optional[requests.Response]:
+    """
+    Rate-limited GET that waits out 429s, up to URLSCAN_RATE_LIMIT_RETRIES times
+    
+    Returns None when the stream is stopped while waiting.
+    """
+    for attempt in range(URLSCAN_RATE_LIMIT_RETRIES + 1):
+        URLSCAN_LIMITER.wait()
+        response = URLSCAN_SESSION.get(url, timeout=30)
+        if response.status_code != 429 or attempt == URLSCAN_RATE_LIMIT_RETRIES:
+            return response
+        
+        delay = urlscan_retry_delay(response)
+        logging.warning(f"⚠️ Rate limit hit, waiting {delay:.0f}s...")
+        if stream is None:
+            time.sleep(delay)
+        elif stream.stopped.wait(delay):
+            return None
+
+
+def parse_urlscan_query(query: str) -> Tuple[frozenset, frozenset]:
+    """Split a query into (page.domain:*substring* terms, all other terms)"""
+    substrings, others = set(), set()
+    for term in query.split(' AND '):
+        term = term.strip()
+        field, _, pattern = term.partition(':')
+        core = pattern[1:-1]
+        if field == 'page.domain' and pattern.startswith('*') and pattern.endswith('*') \
+                and core and '*' not in core:
+            substrings.add(core)
+        else:
+            others.add(term)
+    return frozenset(substrings), frozenset(others)
+
+
+def query_subsumes(broad: Tuple[frozenset, frozenset], narrow: Tuple[frozenset, frozenset]) -> bool:
+    """True when every result of the narrow query also matches the broad one"""
+    broad_substrings, broad_others = broad
+    narrow_substrings, narrow_others = narrow
+    return broad_others <= narrow_others and all(
+        any(substring in longer for longer in narrow_substrings)
+        for substring in broad_substrings
+    )
+
+
+def find_covering_queries(queries: List[str]) -> List[List[int]]:
+    """
+    For each query, the indexes of earlier queries in the batch that cover it
+    
+    e.g. *econt* AND *bg* covers *econt-bg*. Only earlier queries count, so
+    a narrow query listed before its broad parent keeps its priority.
+    """
+    parsed = [parse_urlscan_query(query) for query in queries]
+    return [
+        [j for j in range(i) if query_subsumes(parsed[j], parsed[i])]
+        for i in range(len(queries))
+    ]
+
+
+def query_urlscan(query: str, seen_domains: Set[str],
+                  stream: Optional['DomainStream'] = None) -> Tuple[List[str], bool]:
+    """
+    Run one URLScan.io search
+    
+    Returns the domains it adds to seen_domains, and whether the whole
+    result set was read. Follows search_after cursors until the result set
+    is exhausted or URLSCAN_MAX_PAGES is reached, instead of dropping
+    everything past the first page. seen_domains is shared by every query of
+    the run, so paging also stops early once a later page is mostly domains
+    already seen.
+    
+    With a stream, each page's new domains are handed to the scorer as soon
+    as they arrive, and paging stops once the scorer has stopped.
+    """
+    new_domains = []
+    exhausted = False
+    encoded_query = urllib.parse.quote(query)
+    url = f"{URLSCAN_SEARCH_URL}?q={encoded_query}&size={URLSCAN_PAGE_SIZE}"
+    
+    logging.info(f"🔍 URLScan query: {query[:70]}...")
+    
+    try:
+        page_url = url
+        for page in range(URLSCAN_MAX_PAGES):
+            if stream is not None and stream.stopped.is_set():
+                break
+            
+            response = urlscan_get(page_url, stream)
+            
+            if response is None:
+                break
+            elif response.status_code == 429:
+                logging.warning(f"⚠️ Rate limit still hit after retries: {query[:70]}")
+                break
+            elif response.status_code != 200:
+                logging.warning(f"⚠️ URLScan error {response.status_code}")
+                break
+            
+            data = response.json()
+            results = data.get('results', [])
+            page_domains = {}
+            for result in results:
+                domain = result.get('page', {}).get('domain', '')
+                if domain:
+                    page_domains[domain] = None
+            
+            with SEEN_DOMAINS_LOCK:
+                page_new = [domain for domain in page_domains if domain not in seen_domains]
+                seen_domains.update(page_new)
+            new_domains.extend(page_new)
+            if stream is not None:
+                stream.put(page_new)
+            
+            # Last page: short page, or the API says nothing more is left
+            if len(results) < URLSCAN_PAGE_SIZE or not data.get('has_more', True):
+                exhausted = True
+                break
+            
+            # Saturated: other queries already returned most of this result set
+            if page > 0 and len(page_new) < URLSCAN_SATURATION * len(page_domains):
+                logging.info(f"  ⏹️ Saturated after {len(new_domains)} new domains: {query[:70]}")
+                break
+            
+            sort_key = results[-1].get('sort')
+            if not sort_key:
+                break
+            search_after = ','.join(str(value) for value in sort_key)
+            page_url = f"{url}&search_after={urllib.parse.quote(search_after)}"
+    
+    except Exception as e:
+        logging.error(f"❌ Query error: {e}")
+    
+    logging.info(f"  → {len(new_domains)} new domains from: {query[:70]}")
+    return new_domains, exhausted
+
+
+def run_urlscan_queries(queries: List[str], seen_domains: Set[str],
+                        stream: Optional['DomainStream'] = None) -> Set[str]:
+    """
+    Run the queries concurrently, in list order; return the newly seen domains
+    
+    A query covered by an earlier one waits for it and is skipped when that
+    query read its whole result set. Tasks start in submission order, so a
+    waiting query's cover is always already running.
+    """
+    covering = find_covering_queries(queries)
+    
+    def run(query: str, covers: List[Future]) -> Tuple[List[str], bool]:
+        if any(cover.result()[1] for cover in covers):
+            logging.info(f"⏭️ Skipping subsumed query: {query[:70]}")
+            return [], False
+        return query_urlscan(query, seen_domains, stream)
+    
+    with ThreadPoolExecutor(max_workers=URLSCAN_MAX_WORKERS) as executor:
+        futures = []
+        for query, indexes in zip(queries, covering):
+            futures.append(executor.submit(run, query, [futures[j] for j in indexes]))
+        return {domain for future in futures for domain in future.result()[0]}
+
+
+def fetch_urlscan_targeted(seen_domains: Set[str],
+                           stream: Optional['DomainStream'] = None) -> Set[str]:
     """
     Fetch domains from URLScan.io using targeted queries
     
+    New domains are added to seen_domains (shared across sources) and
+    returned.
+    
     IMPROVED: Now includes equal coverage for:
     - speedy, econt (already had good coverage)
     - bgpost, olx (NOW ADDED - same pattern coverage)
@@ -897,8 +1279,6 @@ def fetch_urlscan_targeted() -> Set[str]:
         logging.warning("⚠️ Skipping URLScan.io (no API key)")
         return set()
     
-    seen_domains = set()
-    
     # OPTIMIZED: Prioritize direct Bulgarian brand impersonation patterns
     # These catch: econt-bg.tk, econt-bg-XX.cfd, econtbg.tk, etc.
     search_queries = [
@@ -968,51 +1348,19 @@ def fetch_urlscan_targeted() -> Set[str]:
         'page.domain:*e-uslugi* AND page.domain:*mvr*',
     ]
     
-    for query in search_queries[:55]:  # Increased to cover online banking brand impersonation patterns
-        try:
-            encoded_query = urllib.parse.quote(query)
-            url = f"https://urlscan.io/api/v1/search/?q={encoded_query}&size=100"
-            headers = {'API-Key': URLSCAN_API_KEY}
-            
-            logging.info(f"🔍 URLScan query: {query[:70]}...")
-            
-            response = requests.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                new_count = 0
-                for result in data.get('results', []):
-                    domain = result.get('page', {}).get('domain', '')
-                    if domain and domain not in seen_domains:
-                        seen_domains.add(domain)
-                        new_count += 1
-                
-                logging.info(f"  → {new_count} new domains (total: {len(seen_domains)})")
-                
-            elif response.status_code == 429:
-                logging.warning(f"⚠️ Rate limit hit, waiting 60s...")
-                time.sleep(60)
-                continue
-            else:
-                logging.warning(f"⚠️ URLScan error {response.status_code}")
-            
-            time.sleep(2)  # Rate limiting
-            
-        except Exception as e:
-            logging.error(f"❌ Query error: {e}")
-            continue
+    queries = search_queries[:55]  # Increased to cover online banking brand impersonation patterns
+    new_domains = run_urlscan_queries(queries, seen_domains, stream)
     
-    logging.info(f"📊 URLScan.io total: {len(seen_domains)} unique domains")
-    return seen_domains
+    logging.info(f"📊 URLScan.io total: {len(new_domains)} new unique domains")
+    return new_domains
 
 
-def fetch_urlscan_recent() -> Set[str]:
-    """Fetch recent domains from URLScan.io (last 24h)"""
+def fetch_urlscan_recent(seen_domains: Set[str],
+                         stream: Optional['DomainStream'] = None) -> Set[str]:
+    """Fetch recent domains from URLScan.io (last 24h) not already in seen_domains"""
     if not URLSCAN_API_KEY:
         return set()
     
-    seen_domains = set()
-    
     queries = [
         # Recent suspicious TLDs
         'page.domain:*.cfd* AND date:>now-24h',
@@ -1023,35 +1371,159 @@ def fetch_urlscan_recent() -> Set[str]:
         'page.domain:*pages.dev* AND date:>now-24h',
     ]
     
-    for query in queries:
+    new_domains = run_urlscan_queries(queries, seen_domains, stream)
+    
+    logging.info(f"📊 Recent submissions: {len(new_domains)} new domains")
+    return new_domains
+
+
+# ==================== MAIN SCANNING LOGIC ====================
+
+# Detection log triggers: (details key, label, value is a list to join)
+TRIGGER_SPEC = (
+    ('brand_keywords', 'Brand: {}', True),
+    ('free_hosting', 'Hosting: {}', False),
+    ('suspicious_tld', 'TLD: {}', False),
+    ('transaction_keywords', 'Keywords: {}', True),
+    ('bg_tld_abuse', 'Pattern: .bg-XX.TLD', False),
+)
+
+
+class DomainStream:
+    """
+    Bounded hand-off of newly seen domains from fetcher threads to the scorer
+    
+    Fetchers block once URLSCAN_QUEUE_SIZE domains are waiting, so memory
+    for pending work stays bounded. stop() ends the stream early: blocked
+    fetchers give up and the scorer's iteration finishes.
+    """
+    
+    def __init__(self, maxsize: int = URLSCAN_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stopped = threading.Event()
+    
+    def _offer(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+    
+    def put(self, domains: Iterable[str]):
+        for domain in domains:
+            self._offer(domain)
+    
+    def close(self):
+        """Mark the end of the stream once every fetcher is done"""
+        self._offer(None)
+    
+    def stop(self):
+        """End the stream now, dropping anything not yet consumed"""
+        self.stopped.set()
         try:
-            encoded_query = urllib.parse.quote(query)
-            url = f"https://urlscan.io/api/v1/search/?q={encoded_query}&size=100"
-            headers = {'API-Key': URLSCAN_API_KEY}
-            
-            logging.info(f"🔍 Recent: {query[:50]}...")
-            
-            response = requests.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                for result in data.get('results', []):
-                    domain = result.get('page', {}).get('domain', '')
-                    if domain:
-                        seen_domains.add(domain)
+            self.queue.put_nowait(None)  # wake a scorer waiting on an empty queue
+        except queue.Full:
+            pass
+    
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            item = self.queue.get()
+            if item is None or self.stopped.is_set():
+                return
+            yield item
+
+
+def score_one(domain: str) -> Optional[Tuple[int, Dict]]:
+    """
+    Filter and score one domain
+    
+    Top-level and free of shared state so it can run in worker processes.
+    
+    Returns:
+        (score, details) for domains worth reporting, None if filtered out
+    """
+    # FILTER 1: Must be on suspicious platform/TLD (unless manual)
+    # Cheapest check first: one endswith(tuple) call drops most domains
+    if domain not in MANUAL_DOMAIN_SET:
+        if not domain.endswith(TARGET_SUFFIXES):
+            logging.debug(f"[SKIP] Not on suspicious platform: {domain}")
+            return None
+    
+    # SCORE: Calculate suspicion score in one pass; its brand and keyword
+    # hits drive the filters below instead of rescanning the domain
+    score, details = calculate_score(domain)
+    
+    # FILTER 2: Skip infrastructure domains
+    if details.get('infrastructure'):
+        logging.debug(f"[SKIP] Infrastructure: {domain}")
+        return None
+    
+    # FILTER 3: Skip whitelisted legitimate domains
+    if details.get('whitelisted'):
+        logging.debug(f"[SKIP] Whitelisted: {domain}")
+        return None
+    
+    # Additional check for non-brand domains
+    if not details['brand_keywords']:
+        if not details['transaction_keywords'] and score < 60:
+            logging.debug(f"[SKIP] No indicators: {domain} (score: {score})")
+            return None
+    
+    return score, details
+
+
+def score_chunk(domains: List[str]) -> List[Optional[Tuple[int, Dict]]]:
+    """score_one over a chunk of domains (one worker task)"""
+    return [score_one(domain) for domain in domains]
+
+
+def iter_scores(domains: Iterable[str]) -> Iterator[Tuple[str, Optional[Tuple[int, Dict]]]]:
+    """
+    Score a stream of domains, yielding (domain, score_one result) in order
+    
+    The first SCORING_PARALLEL_MIN domains are scored in-process; a stream
+    that keeps going moves to a process pool, fed in SCORING_CHUNKSIZE
+    chunks with a few chunks per worker in flight.
+    """
+    executor = None
+    max_pending = 2 * (os.cpu_count() or 1)
+    pending = deque()
+    chunk = []
+    scored = 0
+    
+    try:
+        for domain in domains:
+            if executor is None:
+                yield domain, score_one(domain)
+                scored += 1
+                if scored >= SCORING_PARALLEL_MIN:
+                    executor = ProcessPoolExecutor(
+                        mp_context=multiprocessing.get_context(SCORING_START_METHOD)
+                    )
+                continue
             
-            time.sleep(2)
+            chunk.append(domain)
+            if len(chunk) >= SCORING_CHUNKSIZE:
+                pending.append((chunk, executor.submit(score_chunk, chunk)))
+                chunk = []
             
-        except Exception as e:
-            logging.warning(f"⚠️ Recent query error: {e}")
-            continue
+            # Hand back finished chunks early; block only when too many are queued
+            while pending and (pending[0][1].done() or len(pending) > max_pending):
+                done_chunk, future = pending.popleft()
+                yield from zip(done_chunk, future.result())
+        
+        if chunk:
+            pending.append((chunk, executor.submit(score_chunk, chunk)))
+        while pending:
+            done_chunk, future = pending.popleft()
+            yield from zip(done_chunk, future.result())
     
-    logging.info(f"📊 Recent submissions: {len(seen_domains)} domains")
-    return seen_domains
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
 
-# ==================== MAIN SCANNING LOGIC ====================
-
 def scan_domains(duration: int = None, sources: List[str] = ['urlscan', 'manual']) -> None:
     """Main scanning function"""
     start_time = datetime.datetime.now(timezone.utc)
@@ -1067,102 +1539,114 @@ def scan_domains(duration: int = None, sources: List[str] = ['urlscan', 'manual'
     logging.info(f"Brand keywords: {len(BRAND_KEYWORDS)}")
     logging.info("=" * 60)
     
+    # Load the feed once; new detections are appended in memory
+    feed_data = load_existing_feed()
+    feed_index = {entry['domain'] for entry in feed_data}
+    feed_size = len(feed_data)
+    
+    # Fetchers run in the background and stream new domains to the scoring
+    # loop below, so scoring starts with the first URLScan page
     all_domains = set()
+    stream = DomainStream()
+    
+    def fetch_all():
+        try:
+            # 0. Manual domains
+            if 'manual' in sources:
+                manual_domains = check_manual_domains()
+                all_domains.update(manual_domains)
+                stream.put(manual_domains)
+            
+            # 1. URLScan.io
+            if 'urlscan' in sources:
+                logging.info("🔍 Querying URLScan.io...")
+                logging.info("   Coverage: speedy, econt, bgpost, olx (EQUAL)")
+                
+                # all_domains is shared with the fetchers, so a domain returned by
+                # several overlapping queries is only counted (and paged past) once
+                fetch_urlscan_targeted(all_domains, stream)
+                fetch_urlscan_recent(all_domains, stream)
+        except Exception as e:
+            logging.error(f"❌ Fetch error: {e}")
+        finally:
+            stream.close()
     
-    # 0. Manual domains
-    if 'manual' in sources:
-        manual_domains = check_manual_domains()
-        all_domains.update(manual_domains)
+    def on_deadline():
+        logging.info("⏱️ Duration limit reached, stopping fetch")
+        stream.stop()
     
-    # 1. URLScan.io
-    if 'urlscan' in sources:
-        logging.info("🔍 Querying URLScan.io...")
-        logging.info("   Coverage: speedy, econt, bgpost, olx (EQUAL)")
-        
-        targeted_domains = fetch_urlscan_targeted()
-        all_domains.update(targeted_domains)
-        
-        recent_domains = fetch_urlscan_recent()
-        all_domains.update(recent_domains)
+    fetcher = threading.Thread(target=fetch_all, name='domain-fetcher', daemon=True)
+    timer = threading.Timer(duration, on_deadline) if duration else None
     
-    # Process all domains
+    # Process domains as they arrive
     logging.info("=" * 60)
-    logging.info(f"📊 Processing {len(all_domains)} total domains...")
+    logging.info("📊 Processing domains as they are fetched...")
     logging.info("=" * 60)
     
-    for domain in all_domains:
-        if duration:
-            elapsed = (datetime.datetime.now(timezone.utc) - start_time).total_seconds()
-            if elapsed > duration:
+    def unique_domains() -> Iterator[str]:
+        # Stripping can make distinct raw entries equal
+        queued = set()
+        for domain in stream:
+            domain = domain.strip()
+            if domain and not domain.startswith('*') and domain not in queued:
+                queued.add(domain)
+                yield domain
+    
+    # Monotonic deadline: one cheap clock read per domain, no tz math
+    deadline = time.monotonic() + duration if duration else math.inf
+    
+    fetcher.start()
+    if timer is not None:
+        timer.daemon = True
+        timer.start()
+    
+    try:
+        for domain, result in iter_scores(unique_domains()):
+            if time.monotonic() > deadline:
                 logging.info(f"⏱️ Duration limit reached. Processed {len(processed_domains)} domains")
                 break
-        
-        domain = domain.strip()
-        
-        if not domain or domain.startswith('*') or domain in processed_domains:
-            continue
-        
-        processed_domains.add(domain)
-        
-        # FILTER 1: Skip infrastructure domains
-        if is_infrastructure_domain(domain):
-            logging.debug(f"[SKIP] Infrastructure: {domain}")
-            continue
-        
-        # FILTER 2: Skip whitelisted legitimate domains
-        if is_whitelisted(domain):
-            logging.debug(f"[SKIP] Whitelisted: {domain}")
-            continue
-        
-        # FILTER 3: Must be on suspicious platform/TLD (unless manual)
-        if domain not in MANUAL_CHECK_DOMAINS:
-            matches_suffix = any(domain.endswith(suffix) for suffix in TARGET_SUFFIXES)
-            if not matches_suffix:
-                logging.debug(f"[SKIP] Not on suspicious platform: {domain}")
-                continue
-        
-        # Check for brand/courier keywords
-        has_courier, courier_keywords = contains_courier_keyword(domain)
-        
-        # SCORE: Calculate suspicion score
-        score, details = calculate_score(domain)
-        
-        # Additional check for non-brand domains
-        if not has_courier:
-            has_transaction = any(kw in domain.lower() for kw in TRANSACTION_KEYWORDS)
-            if not has_transaction and score < 60:
-                logging.debug(f"[SKIP] No indicators: {domain} (score: {score})")
-                continue
-        
-        if score >= SCORE_THRESHOLD:
-            phishing_domains.add(domain)
-
-            # Determine what triggered the detection
-            triggers = []
-            if details['brand_keywords']:
-                triggers.append(f"Brand: {', '.join(details['brand_keywords'])}")
-            if details['free_hosting']:
-                triggers.append(f"Hosting: {details['free_hosting']}")
-            if details['suspicious_tld']:
-                triggers.append(f"TLD: {details['suspicious_tld']}")
-            if details['transaction_keywords']:
-                triggers.append(f"Keywords: {', '.join(details['transaction_keywords'])}")
-            if details.get('bg_tld_abuse'):
-                triggers.append("Pattern: .bg-XX.TLD")
             
-            # Log detection
-            logging.warning(
-                f"🚨 PHISHING DETECTED: {domain} | "
-                f"Score: {score}/100 | "
-                f"{' | '.join(triggers)}"
-            )
+            processed_domains.add(domain)
             
-            # Add to feed
-            add_to_feed(domain, score, details, 'scanner')
-        else:
-            logging.info(
-                f"[SUSPICIOUS] {domain} (score: {score}) - Below threshold"
-            )
+            if result is None:
+                continue
+            score, details = result
+            
+            if score >= SCORE_THRESHOLD:
+                phishing_domains.add(domain)
+
+                # Determine what triggered the detection
+                triggers = [
+                    label.format(', '.join(value) if is_list else value)
+                    for key, label, is_list in TRIGGER_SPEC
+                    if (value := details.get(key))
+                ]
+                
+                # Log detection
+                logging.warning(
+                    f"🚨 PHISHING DETECTED: {domain} | "
+                    f"Score: {score}/100 | "
+                    f"{' | '.join(triggers)}"
+                )
+                
+                # Add to feed
+                add_to_feed(domain, score, details, 'scanner', feed_data, feed_index)
+            else:
+                logging.info(
+                    f"[SUSPICIOUS] {domain} (score: {score}) - Below threshold"
+                )
+    finally:
+        # Stop paging on early exit; in-flight requests finish quickly
+        stream.stop()
+        if timer is not None:
+            timer.cancel()
+        fetcher.join()
+    
+    logging.info(f"📊 Fetched {len(all_domains)} total domains")
+    
+    # Write the feed once with every new detection
+    if len(feed_data) > feed_size:
+        save_feed(feed_data)
     
     # Save statistics
     elapsed = (datetime.datetime.now(timezone.utc) - start_time).total_seconds()
@@ -1185,6 +1669,7 @@ def scan_domains(duration: int = None, sources: List[str] = ['urlscan', 'manual'
 
 def main():
     import argparse
+    global URLSCAN_MAX_PAGES
     
     parser = argparse.ArgumentParser(
         description='Bulgarian Phishing Domain Detector - Fixed',
@@ -1203,6 +1688,13 @@ def main():
         default=['urlscan', 'manual'],
         help='Data sources to use (default: urlscan, manual)'
     )
+    parser.add_argument(
+        '--max-pages',
+        type=int,
+        default=URLSCAN_MAX_PAGES,
+        help=f'Maximum URLScan result pages per query (default: {URLSCAN_MAX_PAGES}, '
+             'env URLSCAN_MAX_PAGES)'
+    )
     parser.add_argument(
         '--check-domain',
         type=str,
@@ -1211,6 +1703,8 @@ def main():
     
     args = parser.parse_args()
     
+    URLSCAN_MAX_PAGES = max(1, args.max_pages)
+    
     # If specific domain check requested
     if args.check_domain:
         domain = args.check_domain.strip().lower()
@@ -1220,6 +1714,10 @@ def main():
             logging.info(f"✅ {domain} is WHITELISTED (legitimate)")
             return
         
+        if is_infrastructure_domain(domain):
+            logging.info(f"ℹ️ {domain} is INFRASTRUCTURE (excluded from scanning)")
+            return
+        
         score, details = calculate_score(domain)
         
         logging.info(f"\n{'=' * 60}")
@@ -5,25 +5,389 @@ Analyzes high-risk domains (score ≥80) using OpenRouter API
 Runs daily to enrich detection feed with AI analysis
 """
 
+import asyncio
+import hashlib
 import json
+import math
 import os
+import random
+import re
+import sqlite3
 import sys
 import time
-import requests
+import httpx
+from collections import deque
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # Fall back to decoding the response into dicts
+    msgspec = None
+
+try:
+    from tqdm import tqdm
+except ImportError:  # No progress bar, plain per-domain output only
+    tqdm = None
+
+# Progress messages go through tqdm.write so they print above the bar
+log = tqdm.write if tqdm is not None else print
+
+
+# Statuses worth retrying: rate limited or transient upstream failure
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RetriesExhausted(Exception):
+    """Raised when a domain still fails after all retry attempts"""
+
+
+# Chat completion response schema: only the fields we read are decoded
+if msgspec is not None:
+    class CompletionMessage(msgspec.Struct):
+        content: Optional[str] = None
+    
+    class CompletionChoice(msgspec.Struct):
+        message: CompletionMessage
+    
+    class CompletionUsage(msgspec.Struct):
+        total_tokens: int = 0
+    
+    class ChatCompletion(msgspec.Struct):
+        choices: List[CompletionChoice]
+        usage: Optional[CompletionUsage] = None
+    
+    COMPLETION_DECODER = msgspec.json.Decoder(ChatCompletion)
+
+
+def decode_completion(body: bytes) -> Tuple[str, int]:
+    """
+    Extract the reply text and total token usage from a completion response
+    
+    Decodes straight into typed structs with msgspec when available,
+    otherwise through a plain JSON dict.
+    """
+    if msgspec is not None:
+        completion = COMPLETION_DECODER.decode(body)
+        usage = completion.usage.total_tokens if completion.usage else 0
+        return completion.choices[0].message.content, usage
+    
+    result = orjson.loads(body) if orjson is not None else json.loads(body)
+    usage = (result.get('usage') or {}).get('total_tokens') or 0
+    return result['choices'][0]['message']['content'], usage
+
+
+# Response field parsers: each takes the text after "FIELD:" and updates
+# the result dict
+
+def _parse_threat_level(value: str, result: Dict):
+    level = value.upper()
+    if level in ('HIGH', 'MEDIUM', 'LOW'):
+        result['threat_level'] = level
+
+
+def _parse_confidence(value: str, result: Dict):
+    try:
+        result['confidence'] = int(value.replace('%', ''))
+    except ValueError:
+        pass
+
+
+def _parse_phishing_score(value: str, result: Dict):
+    try:
+        result['phishing_score'] = int(value)
+    except ValueError:
+        pass
+
+
+def _parse_mimicked_domain(value: str, result: Dict):
+    # Clean up and validate
+    mimicked = value.lower().replace('www.', '')
+    if mimicked and mimicked != 'none':
+        result['mimicked_domain'] = mimicked
+    else:
+        result['mimicked_domain'] = 'NONE'
+
+
+def _parse_decision(value: str, result: Dict):
+    decision = value.upper()
+    if decision in ('BLOCK', 'INVESTIGATE'):
+        result['decision'] = decision
+
+
+def _parse_reasoning(value: str, result: Dict):
+    result['reasoning'] = value
+
+
+# Line prefix → handler; one dict lookup per line instead of a startswith chain
+PARSERS = {
+    'THREAT_LEVEL': _parse_threat_level,
+    'CONFIDENCE': _parse_confidence,
+    'PHISHING_SCORE': _parse_phishing_score,
+    'MIMICKED_DOMAIN': _parse_mimicked_domain,
+    'DECISION': _parse_decision,
+    'REASONING': _parse_reasoning,
+}
+
+# One multi-line scan pulls every "FIELD: value" line out of a response
+FIELD_RE = re.compile(
+    r'^\s*(' + '|'.join(PARSERS) + r'):(.*)$',
+    re.MULTILINE
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+class SlidingWindowLimiter:
+    """
+    Requests/minute and tokens/minute limiter over a sliding 60s window
+    
+    Callers only wait when a budget is actually exhausted. Token reservations
+    are estimates and get corrected with the usage reported by the API.
+    """
+    
+    def __init__(self, rpm: int, tpm: int, window: float = 60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self.requests = deque()  # request timestamps
+        self.tokens = deque()    # [timestamp, tokens] reservations
+        self.tokens_used = 0
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def _prune(self, now: float):
+        cutoff = now - self.window
+        while self.requests and self.requests[0] <= cutoff:
+            self.requests.popleft()
+        while self.tokens and self.tokens[0][0] <= cutoff:
+            self.tokens_used -= self.tokens.popleft()[1]
+    
+    async def acquire(self, tokens: int) -> List:
+        """Wait until there is budget for one request of ~tokens, then reserve it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                
+                wait = self.blocked_until - now
+                if len(self.requests) >= self.rpm:
+                    wait = max(wait, self.requests[0] + self.window - now)
+                if self.tokens and self.tokens_used + tokens > self.tpm:
+                    wait = max(wait, self.tokens[0][0] + self.window - now)
+                
+                if wait <= 0:
+                    self.requests.append(now)
+                    reservation = [now, tokens]
+                    self.tokens.append(reservation)
+                    self.tokens_used += tokens
+                    return reservation
+                
+                await asyncio.sleep(wait)
+    
+    def record_usage(self, reservation: List, tokens: int):
+        """Replace a reservation's estimate with the actual token usage"""
+        if reservation in self.tokens:
+            self.tokens_used += tokens - reservation[1]
+        reservation[1] = tokens
+    
+    def update_from_headers(self, headers):
+        """
+        Tune limits from rate limit response headers
+        
+        Accepts both OpenRouter (x-ratelimit-limit/-remaining/-reset, reset
+        as epoch ms) and OpenAI-style (-requests suffix) header names.
+        """
+        limit = headers.get('x-ratelimit-limit-requests') or headers.get('x-ratelimit-limit')
+        remaining = headers.get('x-ratelimit-remaining-requests') or headers.get('x-ratelimit-remaining')
+        reset = headers.get('x-ratelimit-reset-requests') or headers.get('x-ratelimit-reset')
+        
+        try:
+            if limit is not None:
+                self.rpm = max(1, min(self.rpm, int(limit)))
+            
+            if remaining is not None and int(remaining) <= 0 and reset is not None:
+                reset = float(reset.rstrip('s'))
+                if reset > 1e12:    # epoch milliseconds
+                    delay = reset / 1000 - time.time()
+                elif reset > 1e9:   # epoch seconds
+                    delay = reset - time.time()
+                else:               # seconds from now
+                    delay = reset
+                self.block_for(min(max(delay, 0), self.window))
+        except ValueError:
+            pass
+    
+    def block_for(self, seconds: float):
+        """Hold every request back for at least seconds from now"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+    
+    def reset_delay(self) -> float:
+        """Seconds until any block lifts and every recorded request has left the window"""
+        now = time.monotonic()
+        window_clear = self.requests[-1] + self.window - now if self.requests else 0.0
+        return max(0.0, self.blocked_until - now, window_clear)
+
+
+class ResponseCache:
+    """
+    SQLite cache of parsed LLM analyses
+    
+    Keyed by model, domain, score and detection details, so re-runs only
+    pay for domains whose inputs changed. Entries expire after ttl seconds.
+    """
+    
+    def __init__(self, path: str, ttl: int = 7 * 24 * 3600):
+        self.ttl = ttl
+        self.hits = 0
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, json TEXT, ts INTEGER)'
+        )
+        self.conn.execute('DELETE FROM cache WHERE ts < ?', (int(time.time()) - ttl,))
+        self.conn.commit()
+    
+    @staticmethod
+    def make_key(model: str, domain: str, score: int, details: Dict) -> str:
+        payload = f"{model}|{domain}|{score}|{json.dumps(details, sort_keys=True)}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            'SELECT json FROM cache WHERE key = ? AND ts >= ?',
+            (key, int(time.time()) - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+    
+    def put(self, key: str, analysis: Dict):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO cache (key, json, ts) VALUES (?, ?, ?)',
+            (key, json.dumps(analysis), int(time.time()))
+        )
+        self.conn.commit()
+    
+    def close(self):
+        self.conn.close()
 
 
 class OpenRouterAnalyzer:
     """Analyzer using free models via OpenRouter"""
     
-    def __init__(self, api_key: str, model: str = "arcee-ai/trinity-large-preview:free"):
+    def __init__(self, api_key: str, model: str = "arcee-ai/trinity-large-preview:free",
+                 cache: Optional[ResponseCache] = None,
+                 small_model: Optional[str] = "nvidia/nemotron-nano-9b-v2:free"):
         self.api_key = api_key
         self.model = model
+        self.cache = cache
+        
+        # Two-stage cascade: every domain goes to the small model first and
+        # only uncertain verdicts are re-asked to the large model (self.model)
+        self.small_model = small_model if small_model != model else None
+        self.escalation_confidence = 70  # escalate at or below this confidence
+        
         self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        self._client = None  # created on first request, see _get_client
         self.requests_made = 0
         self.max_requests = 200  # Conservative daily limit
         
+        # Free tier allows 20 requests/minute; with ~10s per completion that
+        # is ceil(20/60 * 10) = 4 requests in flight at once
+        self.requests_per_minute = 20
+        self.expected_latency = 10
+        self.max_concurrent = math.ceil(self.requests_per_minute / 60 * self.expected_latency)
+        
+        # Token budget per minute; tightened from response headers when available
+        self.tokens_per_minute = 40000
+        self.max_tokens = 400  # per domain
+        
+        # Domains sent per request; the system prompt and instructions are
+        # shared, so this cuts both request count and tokens per domain
+        self.batch_size = 10
+        self.limiter = SlidingWindowLimiter(self.requests_per_minute, self.tokens_per_minute)
+        
+        # Retries for 429/5xx and network errors
+        self.max_retries = 5
+        self.backoff_base = 2
+        self.max_backoff = 60
+        
+        # Prompts are built once; only the per-domain fields are filled in per call
+        self._system_msg = "You are a cybersecurity expert specializing in phishing detection. Analyze domains targeting Bulgarian courier services. Be concise and decisive."
+        
+        # Legitimate domains the model may name as the impersonation target
+        whitelisted = ', '.join([
+            'econt.bg', 'econt.com', 'speedy.bg', 'bgpost.bg', 'bulgariapost.bg',
+            'olx.bg', 'dhl.bg', 'sameday.bg', 'evropat.bg', 'easypay.bg',
+            'epay.bg', 'borica.bg', 'fastpay.bg', 'intime.bg', 'boxnow.bg'
+        ][:10])
+        
+        rules = """Rules:
+- THREAT_LEVEL: HIGH if obvious brand impersonation, MEDIUM if suspicious patterns, LOW if unclear
+- CONFIDENCE: 0-100 numeric value only (no % symbol)
+- MIMICKED_DOMAIN: Must be from the whitelisted list above, or NONE
+- DECISION: BLOCK for clear phishing, INVESTIGATE for suspicious but unclear
+- REASONING: Single sentence, max 100 characters, focus on PRIMARY indicator
+
+Be precise and concise."""
+        
+        self._prompt_template = """Analyze this suspected phishing domain targeting Bulgarian services:
+
+**Domain:** {domain}
+**Phishing Score:** {score}/100 (rule-based)
+**Detected Brands:** {brands}
+**Transaction Keywords:** {trans_kw}
+**TLD:** {tld}
+
+**Whitelisted Legitimate Domains:**
+""" + whitelisted + """
+
+**Task:** Provide EXACTLY this format (no extra text):
+
+THREAT_LEVEL: [HIGH/MEDIUM/LOW]
+CONFIDENCE: [0-100]
+PHISHING_SCORE: {score}
+MIMICKED_DOMAIN: [Which legitimate domain is being impersonated, e.g., econt.bg, speedy.bg, or NONE if no clear target]
+DECISION: [BLOCK/INVESTIGATE]
+REASONING: [One concise sentence explaining the primary threat indicator]
+
+""" + rules
+        
+        self._batch_prompt_template = """Analyze these {count} suspected phishing domains targeting Bulgarian services:
+
+{domain_lines}
+
+**Whitelisted Legitimate Domains:**
+""" + whitelisted + """
+
+**Task:** For EACH domain, in the order given, output EXACTLY this block (no extra text), with a line containing only --- between blocks:
+
+DOMAIN: [domain exactly as given]
+THREAT_LEVEL: [HIGH/MEDIUM/LOW]
+CONFIDENCE: [0-100]
+PHISHING_SCORE: [score as given]
+MIMICKED_DOMAIN: [Which legitimate domain is being impersonated, e.g., econt.bg, speedy.bg, or NONE if no clear target]
+DECISION: [BLOCK/INVESTIGATE]
+REASONING: [One concise sentence explaining the primary threat indicator]
+
+""" + rules
+        
         # Model display names
         self.model_names = {
             "arcee-ai/trinity-large-preview:free": "Arcee Trinity Large",
@@ -34,7 +398,7 @@ class OpenRouterAnalyzer:
             "qwen/qwen3-coder:free": "Qwen 3 Coder"
         }
         
-    def analyze_domain(self, domain: str, score: int, details: Dict) -> Optional[Dict]:
+    async def analyze_domain(self, domain: str, score: int, details: Dict) -> Optional[Dict]:
         """
         Analyze a domain using LLM
         
@@ -45,69 +409,256 @@ class OpenRouterAnalyzer:
         
         Returns:
             Analysis dict or None if failed
+        
+        Raises:
+            RetriesExhausted: if every attempt hit a retryable error
         """
-        if self.requests_made >= self.max_requests:
-            print(f"⚠️  Daily limit reached ({self.max_requests} requests)")
-            return None
+        return (await self.analyze_batch([(domain, score, details)]))[0]
+    
+    async def analyze_batch(self, entries: List[Tuple[str, int, Dict]]) -> List[Optional[Dict]]:
+        """
+        Analyze several domains with a single LLM request
+        
+        With a small model configured, the batch goes to it first; domains
+        whose verdict is uncertain (MEDIUM/UNKNOWN threat or low confidence)
+        or that failed are escalated to the large model in one more request.
+        
+        Args:
+            entries: (domain, score, details) tuples
+        
+        Returns:
+            Analysis dict or None for each entry, in the same order
+        
+        Raises:
+            RetriesExhausted: if every attempt hit a retryable error
+        """
+        if self.small_model is None:
+            return await self._analyze_batch_with(self.model, entries)
+        
+        results = await self._analyze_batch_with(self.small_model, entries)
+        
+        escalate = [i for i, analysis in enumerate(results) if self._needs_escalation(analysis)]
+        if escalate:
+            escalated = await self._analyze_batch_with(self.model, [entries[i] for i in escalate])
+            for i, analysis in zip(escalate, escalated):
+                if analysis is not None:
+                    analysis['escalated_from'] = self.small_model
+                    results[i] = analysis
         
-        # Build analysis prompt
-        prompt = self._build_prompt(domain, score, details)
+        return results
+    
+    def _needs_escalation(self, analysis: Optional[Dict]) -> bool:
+        """Whether a small-model verdict should be re-checked by the large model"""
+        if analysis is None:
+            return True
+        return (
+            analysis['threat_level'] in ('MEDIUM', 'UNKNOWN')
+            or analysis['confidence'] <= self.escalation_confidence
+        )
+    
+    async def _analyze_batch_with(self, model: str, entries: List[Tuple[str, int, Dict]],
+                                  follow_up: bool = True) -> List[Optional[Dict]]:
+        """
+        Analyze entries with one model; see analyze_batch
+        
+        Domains missing from the reply are asked for again in one follow-up
+        request (without a further follow-up of its own).
+        """
+        results = [None] * len(entries)
+        
+        # Reuse previous analyses of the same inputs
+        cache_keys = [None] * len(entries)
+        pending = []
+        for i, (domain, score, details) in enumerate(entries):
+            if self.cache is not None:
+                cache_keys[i] = ResponseCache.make_key(model, domain, score, details)
+                cached = self.cache.get(cache_keys[i])
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            pending.append(i)
+        
+        if not pending:
+            return results
+        
+        if len(pending) == 1:
+            domain, score, details = entries[pending[0]]
+            prompt = self._build_prompt(domain, score, details)
+            label = domain
+        else:
+            prompt = self._build_batch_prompt([entries[i] for i in pending])
+            label = f"batch of {len(pending)} domains"
+        
+        analysis_text = await self._complete(model, prompt, self.max_tokens * len(pending), label)
+        if analysis_text is None:
+            return results
         
         try:
-            response = requests.post(
-                self.base_url,
+            if len(pending) == 1:
+                blocks = [(analysis_text, self._parse_analysis(analysis_text))]
+            else:
+                blocks = self._parse_batch_analysis(analysis_text, [entries[i][0] for i in pending])
+        except Exception as e:
+            log(f"❌ Error parsing analysis for {label}: {e}")
+            return results
+        
+        analyzed_at = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+        missing = []
+        for i, block in zip(pending, blocks):
+            if block is None:
+                missing.append(i)
+                continue
+            
+            raw, parsed = block
+            
+            # Add metadata
+            parsed['raw_analysis'] = raw
+            parsed['model'] = model
+            parsed['analyzed_at'] = analyzed_at
+            
+            # Nothing parsed from the reply: don't pin it, ask again next run
+            if cache_keys[i] is not None and parsed['threat_level'] != 'UNKNOWN':
+                self.cache.put(cache_keys[i], parsed)
+            
+            results[i] = parsed
+        
+        # Ask again, in one request, for the domains the model skipped in its reply
+        if missing and follow_up:
+            log(f"⚠️  No result for {', '.join(entries[i][0] for i in missing)} in batch reply, asking again")
+            retried = await self._analyze_batch_with(model, [entries[i] for i in missing], follow_up=False)
+            for i, analysis in zip(missing, retried):
+                results[i] = analysis
+        
+        return results
+    
+    async def _complete(self, model: str, prompt: str, max_tokens: int, label: str) -> Optional[str]:
+        """
+        Send one chat completion request, retrying transient failures
+        
+        Returns:
+            Response text or None on a non-retryable failure
+        
+        Raises:
+            RetriesExhausted: if every attempt hit a retryable error
+        """
+        for attempt in range(self.max_retries):
+            if self.requests_made >= self.max_requests:
+                log(f"⚠️  Daily limit reached ({self.max_requests} requests)")
+                return None
+            
+            # Count the request up front so concurrent calls can't overshoot the limit
+            self.requests_made += 1
+            
+            try:
+                reservation = await self.limiter.acquire(estimate_tokens(prompt) + max_tokens)
+                response = await self._get_client().post(
+                    self.base_url,
+                    json={
+                        "model": model,
+                        "messages": [
+                            {
+                                "role": "system",
+                                "content": self._system_msg
+                            },
+                            {
+                                "role": "user",
+                                "content": prompt
+                            }
+                        ],
+                        "temperature": 0.2,  # Low temperature for consistent analysis
+                        "max_tokens": max_tokens
+                    },
+                    timeout=30 + 5 * (max_tokens // self.max_tokens - 1)
+                )
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                log(f"⚠️  Network error for {label}: {type(e).__name__}")
+                await self._backoff(None, attempt)
+                continue
+            
+            self.limiter.update_from_headers(response.headers)
+            
+            if response.status_code in RETRY_STATUSES:
+                log(f"⚠️  API returned {response.status_code} for {label}")
+                await self._backoff(response, attempt)
+                continue
+            
+            if response.status_code != 200:
+                log(f"❌ API error {response.status_code}: {response.text[:200]}")
+                return None
+            
+            try:
+                analysis_text, total_tokens = decode_completion(response.content)
+                if total_tokens:
+                    self.limiter.record_usage(reservation, total_tokens)
+                
+                return analysis_text
+                
+            except Exception as e:
+                log(f"❌ Error analyzing {label}: {e}")
+                return None
+        
+        raise RetriesExhausted(label)
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Return the shared HTTP client, creating it on first use
+        
+        Built lazily so it binds to the running event loop. Keep-alive and
+        HTTP/2 multiplexing let every request reuse one TLS connection.
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(
                 headers={
                     "Authorization": f"Bearer {self.api_key}",
                     "HTTP-Referer": "https://github.com/bg-phishing-detector",
                     "X-Title": "BG Phishing Detector"
                 },
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are a cybersecurity expert specializing in phishing detection. Analyze domains targeting Bulgarian courier services. Be concise and decisive."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.2,  # Low temperature for consistent analysis
-                    "max_tokens": 400
-                },
+                http2=True,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
                 timeout=30
             )
+        return self._client
+    
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _backoff(self, response: Optional[httpx.Response], attempt: int):
+        """Sleep before the next attempt, unless this was the last one"""
+        if attempt + 1 < self.max_retries:
+            wait = self._retry_delay(response, attempt)
+            log(f"   Retrying in {wait:.0f}s...")
+            await asyncio.sleep(wait)
+    
+    def _retry_delay(self, response: Optional[httpx.Response], attempt: int) -> float:
+        """
+        Seconds to wait before the next attempt
+        
+        Prefers the server's Retry-After or rate limit reset time, otherwise
+        uses exponential backoff with jitter.
+        """
+        if response is not None:
+            retry_after = response.headers.get('retry-after')
+            if retry_after:
+                try:
+                    delay = float(retry_after)
+                except ValueError:
+                    try:
+                        delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    except (TypeError, ValueError):
+                        delay = None
+                if delay is not None:
+                    delay = min(self.max_backoff, max(0.0, delay))
+                    self.limiter.block_for(delay)
+                    return delay
             
-            if response.status_code == 200:
-                result = response.json()
-                analysis_text = result['choices'][0]['message']['content']
-                self.requests_made += 1
-                
-                # Parse analysis
-                parsed = self._parse_analysis(analysis_text)
-                
-                # Add metadata
-                parsed['raw_analysis'] = analysis_text
-                parsed['model'] = self.model
-                parsed['analyzed_at'] = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
-                
-                # Rate limiting: 3 seconds between requests (respects 20/minute limit)
-                time.sleep(3)
-                
-                return parsed
-                
-            elif response.status_code == 429:
-                print(f"⚠️  Rate limit hit, waiting 60s...")
-                time.sleep(60)
-                return None
-            else:
-                print(f"❌ API error {response.status_code}: {response.text[:200]}")
-                return None
-                
-        except Exception as e:
-            print(f"❌ Error analyzing {domain}: {e}")
-            return None
+            blocked_for = self.limiter.blocked_until - time.monotonic()
+            if blocked_for > 0:
+                return min(self.max_backoff, blocked_for + random.uniform(0, 1))
+        
+        return min(self.max_backoff, self.backoff_base * 2 ** attempt + random.uniform(0, 1))
     
     def _build_prompt(self, domain: str, score: int, details: Dict) -> str:
         """Build analysis prompt for LLM"""
@@ -115,46 +666,66 @@ class OpenRouterAnalyzer:
         # Extract key details
         brands = ', '.join(details.get('brand_keywords', []))
         trans_kw = ', '.join(details.get('transaction_keywords', [])[:3])  # Limit to 3
-        tld = details.get('suspicious_tld', 'N/A')
-        hosting = details.get('free_hosting', 'N/A')
         
-        # Identify mimicked domain
-        whitelisted = [
-            'econt.bg', 'econt.com', 'speedy.bg', 'bgpost.bg', 'bulgariapost.bg',
-            'olx.bg', 'dhl.bg', 'sameday.bg', 'evropat.bg', 'easypay.bg',
-            'epay.bg', 'borica.bg', 'fastpay.bg', 'intime.bg', 'boxnow.bg'
-        ]
+        return self._prompt_template.format_map({
+            'domain': domain,
+            'score': score,
+            'brands': brands if brands else 'None',
+            'trans_kw': trans_kw if trans_kw else 'None',
+            'tld': details.get('suspicious_tld', 'N/A'),
+        })
+    
+    def _build_batch_prompt(self, entries: List[Tuple[str, int, Dict]]) -> str:
+        """Build one prompt asking for an analysis block per domain"""
         
-        prompt = f"""Analyze this suspected phishing domain targeting Bulgarian services:
-
-**Domain:** {domain}
-**Phishing Score:** {score}/100 (rule-based)
-**Detected Brands:** {brands if brands else 'None'}
-**Transaction Keywords:** {trans_kw if trans_kw else 'None'}
-**TLD:** {tld}
-
-**Whitelisted Legitimate Domains:**
-{', '.join(whitelisted[:10])}
-
-**Task:** Provide EXACTLY this format (no extra text):
-
-THREAT_LEVEL: [HIGH/MEDIUM/LOW]
-CONFIDENCE: [0-100]
-PHISHING_SCORE: {score}
-MIMICKED_DOMAIN: [Which legitimate domain is being impersonated, e.g., econt.bg, speedy.bg, or NONE if no clear target]
-DECISION: [BLOCK/INVESTIGATE]
-REASONING: [One concise sentence explaining the primary threat indicator]
-
-Rules:
-- THREAT_LEVEL: HIGH if obvious brand impersonation, MEDIUM if suspicious patterns, LOW if unclear
-- CONFIDENCE: 0-100 numeric value only (no % symbol)
-- MIMICKED_DOMAIN: Must be from the whitelisted list above, or NONE
-- DECISION: BLOCK for clear phishing, INVESTIGATE for suspicious but unclear
-- REASONING: Single sentence, max 100 characters, focus on PRIMARY indicator
-
-Be precise and concise."""
+        domain_lines = []
+        for n, (domain, score, details) in enumerate(entries, 1):
+            brands = ', '.join(details.get('brand_keywords', []))
+            trans_kw = ', '.join(details.get('transaction_keywords', [])[:3])  # Limit to 3
+            tld = details.get('suspicious_tld', 'N/A')
+            domain_lines.append(
+                f"{n}) domain={domain} score={score}/100 "
+                f"brands={brands if brands else 'None'} "
+                f"keywords={trans_kw if trans_kw else 'None'} tld={tld}"
+            )
         
-        return prompt
+        return self._batch_prompt_template.format_map({
+            'count': len(entries),
+            'domain_lines': '\n'.join(domain_lines),
+        })
+    
+    def _parse_batch_analysis(self, analysis_text: str,
+                              domains: List[str]) -> List[Optional[Tuple[str, Dict]]]:
+        """
+        Split a batch response on '---' and parse each block
+        
+        Blocks without any analysis field (preambles, sign-offs) are
+        ignored. The rest are matched to domains by their DOMAIN line, or by
+        position when no block has one.
+        
+        Returns:
+            (raw block, parsed analysis) or None for each domain, in order
+        """
+        blocks = [b.strip() for b in re.split(r'^\s*-{3,}\s*$', analysis_text, flags=re.MULTILINE)]
+        blocks = [b for b in blocks if FIELD_RE.search(b)]
+        matches = [re.search(r'^\s*DOMAIN:\s*(\S+)', b, flags=re.MULTILINE) for b in blocks]
+        by_position = not any(matches)
+        
+        index = {domain.lower(): i for i, domain in enumerate(domains)}
+        results = [None] * len(domains)
+        
+        for position, (block, match) in enumerate(zip(blocks, matches)):
+            if by_position:
+                i = position if position < len(domains) else None
+            elif match:
+                i = index.get(match.group(1).strip('*`').lower().rstrip('.'))
+            else:
+                continue
+            
+            if i is not None and results[i] is None:
+                results[i] = (block, self._parse_analysis(block))
+        
+        return results
     
     def _parse_analysis(self, analysis_text: str) -> Dict:
         """Parse LLM response into structured format"""
@@ -168,58 +739,38 @@ Be precise and concise."""
             'reasoning': ''
         }
         
-        lines = analysis_text.strip().split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            
-            if line.startswith('THREAT_LEVEL:'):
-                level = line.split(':', 1)[1].strip().upper()
-                if level in ['HIGH', 'MEDIUM', 'LOW']:
-                    result['threat_level'] = level
-            
-            elif line.startswith('CONFIDENCE:'):
-                try:
-                    conf_str = line.split(':', 1)[1].strip().replace('%', '')
-                    result['confidence'] = int(conf_str)
-                except:
-                    pass
-            
-            elif line.startswith('PHISHING_SCORE:'):
-                try:
-                    score_str = line.split(':', 1)[1].strip()
-                    result['phishing_score'] = int(score_str)
-                except:
-                    pass
-            
-            elif line.startswith('MIMICKED_DOMAIN:'):
-                mimicked = line.split(':', 1)[1].strip()
-                # Clean up and validate
-                mimicked = mimicked.lower().replace('www.', '')
-                if mimicked and mimicked != 'none':
-                    result['mimicked_domain'] = mimicked
-                else:
-                    result['mimicked_domain'] = 'NONE'
-            
-            elif line.startswith('DECISION:'):
-                decision = line.split(':', 1)[1].strip().upper()
-                if decision in ['BLOCK', 'INVESTIGATE']:
-                    result['decision'] = decision
-            
-            elif line.startswith('REASONING:'):
-                result['reasoning'] = line.split(':', 1)[1].strip()
+        for field, value in FIELD_RE.findall(analysis_text):
+            PARSERS[field](value.strip(), result)
         
         return result
 
 
+def read_json(path: str):
+    """Read a JSON file, using orjson when available"""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_json(path: str, data):
+    """Write data as 2-space indented JSON, using orjson when available"""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
 def load_feed(feed_path: str) -> List[Dict]:
     """Load phishing feed from JSON"""
     if not os.path.exists(feed_path):
         print(f"❌ Feed file not found: {feed_path}")
         sys.exit(1)
     
-    with open(feed_path, 'r') as f:
-        return json.load(f)
+    return read_json(feed_path)
 
 
 def save_llm_analysis(output_path: str, analyzed_domains: List[Dict]):
@@ -231,28 +782,26 @@ def save_llm_analysis(output_path: str, analyzed_domains: List[Dict]):
         'domains': analyzed_domains
     }
     
-    with open(output_path, 'w') as f:
-        json.dump(output, f, indent=2)
+    write_json(output_path, output)
 
 
-def load_existing_analysis(output_path: str) -> List[str]:
-    """Load list of already analyzed domain names"""
+def load_existing_analysis(output_path: str) -> Set[str]:
+    """Load set of already analyzed domain names"""
     if not os.path.exists(output_path):
-        return []
+        return set()
     
     try:
-        with open(output_path, 'r') as f:
-            data = json.load(f)
-            return [d['domain'] for d in data.get('domains', [])]
+        data = read_json(output_path)
+        return {d['domain'] for d in data.get('domains', [])}
     except:
-        return []
+        return set()
 
 
 def filter_domains_for_analysis(
     feed: List[Dict],
     min_score: int,
     lookback_hours: int,
-    already_analyzed: List[str]
+    already_analyzed: Set[str]
 ) -> List[Dict]:
     """
     Filter domains that need LLM analysis
@@ -261,12 +810,13 @@ def filter_domains_for_analysis(
         feed: Full feed data
         min_score: Minimum score threshold
         lookback_hours: Only analyze domains from last N hours
-        already_analyzed: List of domain names already analyzed
+        already_analyzed: Set of domain names already analyzed
     
     Returns:
         List of domains to analyze
     """
-    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=lookback_hours)
+    # Compare plain timestamps rather than datetime objects
+    cutoff_ts = (datetime.now(timezone.utc) - timedelta(hours=lookback_hours)).timestamp()
     to_analyze = []
     
     for entry in feed:
@@ -284,8 +834,8 @@ def filter_domains_for_analysis(
         detected_at = entry.get('detected_at')
         if detected_at:
             try:
-                detected_time = datetime.fromisoformat(detected_at.replace('Z', '+00:00'))
-                if detected_time < cutoff_time:
+                detected_ts = datetime.fromisoformat(detected_at.replace('Z', '+00:00')).timestamp()
+                if detected_ts < cutoff_ts:
                     continue
             except:
                 pass
@@ -295,6 +845,144 @@ def filter_domains_for_analysis(
     return to_analyze
 
 
+async def analyze_entries(
+    analyzer: OpenRouterAnalyzer,
+    entries: List[Dict]
+) -> AsyncIterator[Tuple[Dict, Optional[Dict]]]:
+    """
+    Analyze feed entries concurrently
+    
+    Entries are grouped into batches of analyzer.batch_size domains per
+    request, with at most analyzer.max_concurrent requests in flight at
+    once. Batches that exhaust their retries are put back and tried once
+    more after the rest, once the rate limit window and any Retry-After
+    block have cleared.
+    
+    Yields:
+        (entry, analysis or None) in completion order
+    """
+    semaphore = asyncio.Semaphore(analyzer.max_concurrent)
+    
+    def make_batches(items: List[Dict]) -> List[List[Dict]]:
+        size = max(1, analyzer.batch_size)
+        return [items[i:i + size] for i in range(0, len(items), size)]
+    
+    async def analyze_bounded(batch: List[Dict]) -> Tuple[List[Dict], List[Optional[Dict]], bool]:
+        async with semaphore:
+            try:
+                analyses = await analyzer.analyze_batch([
+                    (entry.get('domain', 'unknown'), entry.get('score', 0), entry.get('details', {}))
+                    for entry in batch
+                ])
+            except RetriesExhausted:
+                return batch, [None] * len(batch), True
+            return batch, analyses, False
+    
+    failed = []
+    for completed in asyncio.as_completed([analyze_bounded(b) for b in make_batches(entries)]):
+        batch, analyses, exhausted = await completed
+        if exhausted:
+            failed.extend(batch)
+        else:
+            for entry, analysis in zip(batch, analyses):
+                yield entry, analysis
+    
+    if failed:
+        wait = analyzer.limiter.reset_delay()
+        log(f"\n🔁 Retrying {len(failed)} domains that exhausted their retries in {wait:.0f}s...")
+        await asyncio.sleep(wait)
+        for completed in asyncio.as_completed([analyze_bounded(b) for b in make_batches(failed)]):
+            batch, analyses, _ = await completed
+            for entry, analysis in zip(batch, analyses):
+                yield entry, analysis
+
+
+async def run_analysis(analyzer: OpenRouterAnalyzer, to_analyze: List[Dict],
+                       stats: Dict) -> List[Dict]:
+    """Analyze all domains, print each result as it completes and update stats"""
+    analyzed_domains = []
+    
+    # Live progress bar on a terminal; results are printed through it so
+    # the bar stays at the bottom. CI logs get the plain per-domain lines.
+    progress = None
+    if tqdm is not None:
+        progress = tqdm(total=len(to_analyze), unit='domain', desc='LLM analysis',
+                        disable=not sys.stderr.isatty())
+    
+    i = 0
+    try:
+        async for entry, analysis in analyze_entries(analyzer, to_analyze):
+            i += 1
+            domain = entry.get('domain', 'unknown')
+            score = entry.get('score', 0)
+            details = entry.get('details', {})
+            
+            # Collect each domain's report and write it in one call
+            lines = [
+                f"\n[{i}/{len(to_analyze)}] Analyzed: {domain}",
+                f"   Phishing Score: {score}/100"
+            ]
+            
+            if analysis:
+                # Create analyzed entry with all info
+                analyzed_entry = {
+                    'domain': domain,
+                    'detected_at': entry.get('detected_at'),
+                    'phishing_score': score,
+                    'detection_details': details,
+                    'llm_analysis': analysis
+                }
+                analyzed_domains.append(analyzed_entry)
+                stats['analyzed'] += 1
+                if analysis.get('escalated_from'):
+                    stats['escalated'] += 1
+                
+                # Display standardized output
+                threat = analysis['threat_level']
+                confidence = analysis['confidence']
+                mimicked = analysis['mimicked_domain']
+                decision = analysis['decision']
+                reasoning = analysis['reasoning']
+                
+                # Threat level with confidence
+                if threat == 'HIGH':
+                    stats['high_threat'] += 1
+                    lines.append(f"   🚨 Threat Level: HIGH")
+                elif threat == 'MEDIUM':
+                    stats['medium_threat'] += 1
+                    lines.append(f"   ⚠️  Threat Level: MEDIUM")
+                elif threat == 'LOW':
+                    stats['low_threat'] += 1
+                    lines.append(f"   ℹ️  Threat Level: LOW")
+                
+                lines.append(f"   📊 Confidence: {confidence}%")
+                lines.append(f"   🎯 Mimicked Domain: {mimicked}")
+                
+                # Decision
+                if decision == 'BLOCK':
+                    stats['block_recommended'] += 1
+                    lines.append(f"   🛑 Decision: BLOCK")
+                else:
+                    lines.append(f"   🔍 Decision: INVESTIGATE")
+                
+                lines.append(f"   💡 {reasoning}")
+                
+            else:
+                stats['errors'] += 1
+                lines.append(f"   ❌ Analysis failed")
+            
+            log('\n'.join(lines))
+            if progress is not None:
+                progress.update(1)
+    finally:
+        if progress is not None:
+            progress.close()
+        # Release pooled connections before the event loop closes
+        await analyzer.aclose()
+    
+    return analyzed_domains
+
+
 def main():
     import argparse
     
@@ -337,11 +1025,40 @@ def main():
         ],
         help='LLM model to use (default: arcee-ai/trinity-large-preview:free)'
     )
+    parser.add_argument(
+        '--small-model',
+        type=str,
+        default='nvidia/nemotron-nano-9b-v2:free',
+        choices=[
+            'none',
+            'nvidia/nemotron-nano-9b-v2:free',
+            'nvidia/nemotron-3-nano-30b-a3b:free',
+            'qwen/qwen3-coder:free'
+        ],
+        help='Cheaper first-pass model; uncertain verdicts escalate to --model '
+             '(default: nvidia/nemotron-nano-9b-v2:free, "none" to disable)'
+    )
     parser.add_argument(
         '--output-file',
         default='feed/llm-analysis.json',
         help='Output file for LLM analysis (default: feed/llm-analysis.json)'
     )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=10,
+        help='Domains analyzed per LLM request (default: 10)'
+    )
+    parser.add_argument(
+        '--cache-file',
+        default='.cache/llm-responses.db',
+        help='SQLite cache of LLM responses (default: .cache/llm-responses.db)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always query the LLM, ignoring cached responses'
+    )
     
     args = parser.parse_args()
     
@@ -381,13 +1098,20 @@ def main():
         return
     
     # Initialize analyzer with selected model
-    analyzer = OpenRouterAnalyzer(api_key, model=args.model)
+    cache = None if args.no_cache else ResponseCache(args.cache_file)
+    small_model = None if args.small_model == 'none' else args.small_model
+    analyzer = OpenRouterAnalyzer(api_key, model=args.model, cache=cache, small_model=small_model)
+    analyzer.batch_size = args.batch_size
     model_display = analyzer.model_names.get(args.model, args.model)
     
     print(f"\n🔍 Analyzing {len(to_analyze)} high-risk domains...")
     print(f"   Model: {model_display}")
+    if analyzer.small_model:
+        small_display = analyzer.model_names.get(analyzer.small_model, analyzer.small_model)
+        print(f"   First pass: {small_display} (escalates at confidence ≤{analyzer.escalation_confidence} or MEDIUM)")
     print(f"   Score threshold: ≥{args.min_score}")
     print(f"   Lookback window: {args.lookback_hours} hours")
+    print(f"   Concurrent requests: {analyzer.max_concurrent} (batches of {analyzer.batch_size})")
     print(f"=" * 60)
     
     # Track statistics
@@ -398,69 +1122,15 @@ def main():
         'low_threat': 0,
         'block_recommended': 0,
         'false_positives': 0,
-        'errors': 0
+        'errors': 0,
+        'escalated': 0
     }
     
-    # Track analyzed domains
-    analyzed_domains = []
+    # Analyze domains concurrently
+    analyzed_domains = asyncio.run(run_analysis(analyzer, to_analyze, stats))
     
-    # Analyze each domain
-    for i, entry in enumerate(to_analyze, 1):
-        domain = entry.get('domain', 'unknown')
-        score = entry.get('score', 0)
-        details = entry.get('details', {})
-        
-        print(f"\n[{i}/{len(to_analyze)}] Analyzing: {domain}")
-        print(f"   Phishing Score: {score}/100")
-        
-        # Perform LLM analysis
-        analysis = analyzer.analyze_domain(domain, score, details)
-        
-        if analysis:
-            # Create analyzed entry with all info
-            analyzed_entry = {
-                'domain': domain,
-                'detected_at': entry.get('detected_at'),
-                'phishing_score': score,
-                'detection_details': details,
-                'llm_analysis': analysis
-            }
-            analyzed_domains.append(analyzed_entry)
-            stats['analyzed'] += 1
-            
-            # Display standardized output
-            threat = analysis['threat_level']
-            confidence = analysis['confidence']
-            mimicked = analysis['mimicked_domain']
-            decision = analysis['decision']
-            reasoning = analysis['reasoning']
-            
-            # Threat level with confidence
-            if threat == 'HIGH':
-                stats['high_threat'] += 1
-                print(f"   🚨 Threat Level: HIGH")
-            elif threat == 'MEDIUM':
-                stats['medium_threat'] += 1
-                print(f"   ⚠️  Threat Level: MEDIUM")
-            elif threat == 'LOW':
-                stats['low_threat'] += 1
-                print(f"   ℹ️  Threat Level: LOW")
-            
-            print(f"   📊 Confidence: {confidence}%")
-            print(f"   🎯 Mimicked Domain: {mimicked}")
-            
-            # Decision
-            if decision == 'BLOCK':
-                stats['block_recommended'] += 1
-                print(f"   🛑 Decision: BLOCK")
-            else:
-                print(f"   🔍 Decision: INVESTIGATE")
-            
-            print(f"   💡 {reasoning}")
-            
-        else:
-            stats['errors'] += 1
-            print(f"   ❌ Analysis failed")
+    if cache is not None:
+        cache.close()
     
     # Save LLM analysis to separate file
     if analyzed_domains:
@@ -481,6 +1151,10 @@ def main():
     print(f"  Block recommended: {stats['block_recommended']}")
     print(f"  False positives: {stats['false_positives']}")
     print(f"  Errors: {stats['errors']}")
+    if analyzer.small_model:
+        print(f"  Escalated to {model_display}: {stats['escalated']}")
+    if cache is not None:
+        print(f"  Cache hits: {cache.hits}")
     print(f"{'=' * 60}\n")
 
 
@@ -0,0 +1,82 @@
+"""
+Tests for the batch response parser in detection/llm_analyzer.py
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'detection'))
+
+from llm_analyzer import OpenRouterAnalyzer  # noqa: E402
+
+
+def block(domain=None, level='HIGH', confidence=90, decision='BLOCK'):
+    """One analysis block as the batch prompt asks for it"""
+    lines = [f"DOMAIN: {domain}"] if domain else []
+    lines += [
+        f"THREAT_LEVEL: {level}",
+        f"CONFIDENCE: {confidence}%",
+        "PHISHING_SCORE: 85",
+        "MIMICKED_DOMAIN: econt.bg",
+        f"DECISION: {decision}",
+        "REASONING: test",
+    ]
+    return '\n'.join(lines)
+
+
+class ParseBatchAnalysisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.analyzer = OpenRouterAnalyzer('test-key', small_model=None)
+        self.domains = ['a.cfd', 'b.cfd']
+
+    def parse(self, text):
+        return self.analyzer._parse_batch_analysis(text, self.domains)
+
+    def test_blocks_matched_by_domain_line(self):
+        text = f"{block('b.cfd', 'LOW', decision='INVESTIGATE')}\n---\n{block('a.cfd')}"
+        results = self.parse(text)
+        self.assertEqual(results[0][1]['threat_level'], 'HIGH')
+        self.assertEqual(results[0][1]['decision'], 'BLOCK')
+        self.assertEqual(results[1][1]['threat_level'], 'LOW')
+
+    def test_domain_line_markup_and_case_ignored(self):
+        text = f"{block('**A.cfd.**')}\n---\n{block('`b.cfd`', 'MEDIUM')}"
+        results = self.parse(text)
+        self.assertEqual(results[0][1]['threat_level'], 'HIGH')
+        self.assertEqual(results[1][1]['threat_level'], 'MEDIUM')
+
+    def test_preamble_does_not_take_a_slot(self):
+        text = f"Here is my analysis:\n---\n{block('a.cfd')}\n---\n{block('b.cfd', 'LOW')}"
+        results = self.parse(text)
+        self.assertEqual(results[0][1]['threat_level'], 'HIGH')
+        self.assertEqual(results[0][1]['confidence'], 90)
+        self.assertEqual(results[1][1]['threat_level'], 'LOW')
+
+    def test_position_used_only_without_domain_lines(self):
+        text = f"Sure!\n---\n{block(level='LOW')}\n---\n{block()}\n---\nHope this helps."
+        results = self.parse(text)
+        self.assertEqual(results[0][1]['threat_level'], 'LOW')
+        self.assertEqual(results[1][1]['threat_level'], 'HIGH')
+
+    def test_block_without_domain_line_skipped_when_others_have_one(self):
+        text = f"{block(level='LOW')}\n---\n{block('b.cfd')}"
+        results = self.parse(text)
+        self.assertIsNone(results[0])
+        self.assertEqual(results[1][1]['threat_level'], 'HIGH')
+
+    def test_unknown_and_duplicate_domains(self):
+        text = f"{block('c.cfd')}\n---\n{block('a.cfd')}\n---\n{block('a.cfd', 'LOW')}"
+        results = self.parse(text)
+        self.assertEqual(results[0][1]['threat_level'], 'HIGH')
+        self.assertIsNone(results[1])
+
+    def test_reply_without_fields(self):
+        self.assertEqual(self.parse("I cannot help with that.\n---\n"), [None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()